@@ -1,8 +1,9 @@
 import os
-from typing import Dict, Optional
-from fastapi import FastAPI, HTTPException, Response
+import asyncio
+from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import httpx
 import google.generativeai as genai
 from dotenv import load_dotenv
@@ -10,6 +11,10 @@ from fastapi.responses import JSONResponse
 from services.video_finder import VideoFinder
 from services.process_video import VideoProcessor
 from services.voice_generator import VoiceGenerator
+from services.audio_format import AudioFormatter
+from services.persona_memory import PersonaMemory
+from services.conversation import ConversationSession
+from services.persona_context import PersonaContextCache
 
 load_dotenv()
 
@@ -43,9 +48,18 @@ model = genai.GenerativeModel('gemini-2.0-flash')
 # Store personality prompts and voice IDs for each person
 personality_prompts: Dict[str, str] = {}
 voice_ids: Dict[str, str] = {}
+persona_memories: Dict[str, PersonaMemory] = {}
+
+# Chat models compiled per persona, with the persona as system instruction
+persona_contexts = PersonaContextCache()
+
+# Number of retrieved background chunks added to each chat turn
+MEMORY_TOP_K = 4
 
 class PersonRequest(BaseModel):
     name: str
+    tweets: List[str] = []
+    reclone: bool = False  # re-clone the voice even if one exists, when the sample has changed
 
 class ChatRequest(BaseModel):
     name: str
@@ -54,6 +68,12 @@ class ChatRequest(BaseModel):
 class TextToSpeechRequest(BaseModel):
     name: str
     text: str
+    output_format: Optional[str] = None  # "opus", "mp3", "pcm" or an ElevenLabs format name
+    bitrate: Optional[int] = Field(
+        default=None,
+        ge=AudioFormatter.MIN_BITRATE,
+        le=AudioFormatter.MAX_BITRATE
+    )  # kbps
 
 class PersonResponse(BaseModel):
     success: bool
@@ -61,6 +81,20 @@ class PersonResponse(BaseModel):
 
 class ChatResponse(BaseModel):
     response: str
+    persona_tokens: Optional[int] = None
+
+def build_chat_prompt(name: str, message: str) -> str:
+    """The background relevant to this message; the persona itself is the model's system instruction"""
+    # Pull only the background relevant to this message
+    if name not in persona_memories:
+        persona_memories[name] = PersonaMemory(name)
+    memories = persona_memories[name].search(message, k=MEMORY_TOP_K)
+    background = "\n".join(f"- {memory}" for memory in memories)
+
+    return f"""Relevant background information:
+            {background}
+            
+            User: {message}"""
 
 @app.get("/")
 async def root():
@@ -110,22 +144,52 @@ async def create_clone(request: PersonRequest) -> PersonResponse:
             research_data = response.json()
             research_text = research_data['choices'][0]['message']['content']
 
-            # Generate personality prompt using Gemini
-            personality_prompt = model.generate_content(
-                f"""Based on this research about {request.name}, create a detailed system prompt that would help an AI model accurately simulate their personality, speech patterns, and knowledge:
+            # Index the full research (and any tweets) for retrieval during chat.
+            # The previous index is only replaced once the new research is embedded
+            persona_memory = PersonaMemory(request.name)
+            research_indexed = persona_memory.add_texts([research_text], source="research", replace=True) > 0
+            if research_indexed and request.tweets:
+                persona_memory.add_texts(request.tweets, source="tweets", chunk=False)
+            persona_memories[request.name] = persona_memory
+
+            if research_indexed:
+                # Generate a short core persona prompt using Gemini; detailed facts
+                # are retrieved from the persona index on each chat turn instead
+                prompt_request = f"""Based on this research about {request.name}, create a concise system prompt (under 200 words) that would help an AI model accurately simulate their personality, tone and speech patterns. Do not list biographical facts; those are supplied separately.
+
+                {research_text}
+
+                Format the prompt to start with: 'You are {request.name}...'"""
+            else:
+                # Without an index the facts have to live in the prompt itself
+                print(f"Research for {request.name} could not be indexed, using a detailed prompt")
+                prompt_request = f"""Based on this research about {request.name}, create a detailed system prompt that would help an AI model accurately simulate their personality, speech patterns, and knowledge:
 
                 {research_text}
 
                 Format the prompt to start with: 'You are {request.name}...'"""
-            ).text
+
+            personality_prompt = model.generate_content(prompt_request).text
 
             # Store personality prompt
             personality_prompts[request.name] = personality_prompt
 
+            voice_generator = VoiceGenerator()
+
+            # Reuse a voice already cloned for this person; it stays in use
+            # until a re-clone actually replaces it
+            existing_voice = voice_generator.find_existing_voice(request.name)
+            if existing_voice:
+                voice_ids[request.name] = existing_voice["voice_id"]
+                if not request.reclone:
+                    return PersonResponse(
+                        success=True,
+                        message=f"Created AI clone for {request.name} using existing voice clone"
+                    )
+
             # Initialize voice cloning services
             video_finder = VideoFinder()
             video_processor = VideoProcessor()
-            voice_generator = VoiceGenerator()
 
             # Find videos of the person speaking
             profile_info = {"name": request.name, "bio": research_text}
@@ -146,15 +210,27 @@ async def create_clone(request: PersonRequest) -> PersonResponse:
                     message=f"Created AI clone for {request.name}, but couldn't process videos for voice cloning"
                 )
 
+            # Only re-clone when the source audio really changed
+            sample_hash = voice_generator.hash_sample(audio_path)
+            if existing_voice and existing_voice["sample_hash"] == sample_hash:
+                return PersonResponse(
+                    success=True,
+                    message=f"Created AI clone for {request.name}; voice sample unchanged, kept existing voice clone"
+                )
+
             # Generate voice clone
             voice_result = voice_generator.generate_voice_clone(
                 audio_path=audio_path,
                 voice_name=request.name,
-                description=f"AI voice clone of {request.name}"
+                description=f"AI voice clone of {request.name}",
+                sample_hash=sample_hash
             )
 
             if voice_result and 'voice_id' in voice_result:
                 voice_ids[request.name] = voice_result['voice_id']
+                # Free the slot held by the voice this one replaces
+                if existing_voice:
+                    voice_generator.delete_voice(existing_voice["voice_id"])
                 return PersonResponse(
                     success=True,
                     message=f"Successfully created AI clone and voice clone for {request.name}"
@@ -189,23 +265,15 @@ async def chat(request: ChatRequest) -> ChatResponse:
         )
 
     try:
-        chat = model.start_chat(history=[])
-        
-        # Use the stored personality prompt
-        system_prompt = personality_prompts[request.name]
+        # Reuse the model compiled for this persona
+        persona_context = persona_contexts.get(request.name, personality_prompts[request.name])
+        chat = persona_context.model.start_chat(history=[])
         
         # Generate response using Gemini
-        response = chat.send_message(
-            f"""System: You are a simulation of {request.name}. Here is your personality and background information:
-            {system_prompt}
-            
-            Remember to stay in character and respond as {request.name} would.
-            
-            User: {request.message}"""
-        )
+        response = chat.send_message(build_chat_prompt(request.name, request.message))
 
         return JSONResponse(
-            content={"response": response.text},
+            content={"response": response.text, "persona_tokens": persona_context.token_count},
             headers={
                 "Access-Control-Allow-Origin": "http://localhost:3000",
                 "Access-Control-Allow-Methods": "POST, OPTIONS",
@@ -233,7 +301,19 @@ async def text_to_speech_options():
     )
 
 @app.post("/text-to-speech")
-async def text_to_speech(request: TextToSpeechRequest):
+async def text_to_speech(request: TextToSpeechRequest, http_request: Request):
+    # Explicit format wins, otherwise pick the smallest one the client accepts
+    audio_formatter = AudioFormatter()
+    output_format = request.output_format or audio_formatter.negotiate(
+        http_request.headers.get("accept")
+    )
+    audio_format = audio_formatter.resolve(output_format, request.bitrate)
+    if not audio_format:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported output format: {output_format}"
+        )
+
     try:
         # Get voice ID for the requested name
         if request.name not in voice_ids:
@@ -248,29 +328,100 @@ async def text_to_speech(request: TextToSpeechRequest):
         voice_generator = VoiceGenerator()
         
         # Generate speech
-        audio_data = voice_generator.text_to_speech(voice_id, request.text)
+        audio_data = voice_generator.text_to_speech(
+            voice_id,
+            request.text,
+            output_format=audio_format["provider_format"]
+        )
         
         if not audio_data:
             raise HTTPException(
                 status_code=500,
                 detail="Failed to generate speech"
             )
+
+        media_type = audio_format["media_type"]
+        if audio_format["transcode"]:
+            # ffmpeg can take a while, keep it off the event loop
+            transcoded = await asyncio.to_thread(
+                audio_formatter.transcode,
+                audio_data,
+                audio_format["provider_format"],
+                audio_format["transcode"],
+                audio_format["bitrate"]
+            )
+            if transcoded:
+                audio_data = transcoded
+            else:
+                # Raw PCM is large and unplayable on most clients, so fall back to
+                # the smallest format the provider can produce directly
+                fallback = audio_formatter.resolve(AudioFormatter.FALLBACK_FORMAT)
+                audio_data = voice_generator.text_to_speech(
+                    voice_id,
+                    request.text,
+                    output_format=fallback["provider_format"]
+                )
+                if not audio_data:
+                    raise HTTPException(
+                        status_code=500,
+                        detail="Failed to generate speech"
+                    )
+                media_type = fallback["media_type"]
         
         # Return audio data with appropriate headers
         return Response(
             content=audio_data,
-            media_type="audio/mpeg",
+            media_type=media_type,
             headers={
                 "Access-Control-Allow-Origin": "http://localhost:3000",
                 "Access-Control-Allow-Methods": "POST, OPTIONS",
                 "Access-Control-Allow-Headers": "*",
                 "Access-Control-Allow-Credentials": "true",
+                "Vary": "Accept",
             }
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/conversation")
+async def conversation(
+    websocket: WebSocket,
+    name: str,
+    output_format: Optional[str] = None,
+    bitrate: Optional[int] = None
+):
+    # Browsers don't apply CORS to WebSockets, so check the origin here
+    origin = websocket.headers.get("origin")
+    if origin and origin not in origins:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+
+    if name not in personality_prompts:
+        await websocket.close(code=4404, reason="Clone not found. Please create the clone first.")
+        return
+
+    audio_formatter = AudioFormatter()
+    audio_format = audio_formatter.resolve(output_format, bitrate)
+    if not audio_format:
+        await websocket.close(code=4400, reason=f"Unsupported output format: {output_format}")
+        return
+
+    # Resolve the persona once for the whole conversation
+    persona_context = persona_contexts.get(name, personality_prompts[name])
+    session = ConversationSession(
+        websocket,
+        model=persona_context.model,
+        build_prompt=lambda message: build_chat_prompt(name, message),
+        voice_generator=VoiceGenerator(),
+        voice_id=voice_ids.get(name),
+        audio_format=audio_format,
+        audio_formatter=audio_formatter
+    )
+    await session.run()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 5000))
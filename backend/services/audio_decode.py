@@ -0,0 +1,35 @@
+import subprocess
+import numpy as np
+
+def decode_audio(ffmpeg_path, audio_path, sample_rate, max_seconds=None, timeout=120):
+    """
+    Decode audio to mono float samples with ffmpeg
+    Args:
+        ffmpeg_path (str): ffmpeg binary, or None when it is not installed
+        audio_path (str): File to decode
+        sample_rate (int): Output sample rate in Hz
+        max_seconds (float, optional): Only decode the start of the file
+        timeout (int): Seconds before ffmpeg is abandoned
+    Returns:
+        np.ndarray: float32 samples in [-1, 1), or None if nothing could be decoded
+    """
+    if not ffmpeg_path:
+        return None
+
+    try:
+        command = [ffmpeg_path, "-hide_banner", "-loglevel", "error", "-i", audio_path]
+        if max_seconds:
+            command += ["-t", str(max_seconds)]
+        command += ["-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"]
+        result = subprocess.run(command, capture_output=True, timeout=timeout)
+        if not result.stdout:
+            print(f"Error decoding {audio_path}: {result.stderr.decode(errors='ignore')}")
+            return None
+        if result.returncode != 0:
+            # Partially downloaded or slightly corrupt MP3s still decode up to the damage
+            print(f"Warning decoding {audio_path}: {result.stderr.decode(errors='ignore')}")
+        return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+    except Exception as e:
+        print(f"Error decoding {audio_path}: {str(e)}")
+        return None
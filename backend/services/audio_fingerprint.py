@@ -0,0 +1,112 @@
+import os
+import shutil
+import numpy as np
+from services.audio_decode import decode_audio
+
+class AudioFingerprinter:
+    """
+    Landmark fingerprints: spectral peaks paired into (f1, f2, dt) hashes,
+    each stored with the frame it starts at. Two recordings of the same
+    speech share many hashes at one consistent time offset.
+    """
+    SAMPLE_RATE = 8000
+    FFT_SIZE = 512
+    HOP_SIZE = 256  # 32ms frames
+    PEAK_NEIGHBORHOOD = (15, 15)  # frames, bins
+    FAN_OUT = 5  # peaks paired with each anchor
+    MAX_PAIR_FRAMES = 63
+    MIN_ALIGNED_HASHES = 20
+    MIN_MATCH_RATIO = 0.05
+
+    def __init__(self):
+        self.ffmpeg_path = shutil.which("ffmpeg")
+
+    def fingerprint_path(self, audio_path):
+        """Where the fingerprint for an audio file is cached"""
+        return os.path.splitext(audio_path)[0] + ".fp.npy"
+
+    def decode(self, audio_path, max_seconds=None):
+        """Decode audio to mono float samples at SAMPLE_RATE, or None on failure"""
+        return decode_audio(self.ffmpeg_path, audio_path, self.SAMPLE_RATE, max_seconds, timeout=60)
+
+    def fingerprint_samples(self, samples):
+        """
+        Fingerprint mono samples at SAMPLE_RATE
+        Returns:
+            np.ndarray: int64 array of shape (N, 2) holding (hash, frame)
+        """
+        if len(samples) < self.FFT_SIZE:
+            return np.empty((0, 2), dtype=np.int64)
+
+        # Log-magnitude spectrogram
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.FFT_SIZE)[::self.HOP_SIZE]
+        spectrum = np.abs(np.fft.rfft(frames * np.hanning(self.FFT_SIZE), axis=1))
+        spectrogram = np.log(spectrum + 1e-6)
+
+        # Peaks are points equal to the maximum of their neighbourhood (separable max filter)
+        local_max = spectrogram
+        for axis, size in enumerate(self.PEAK_NEIGHBORHOOD):
+            pad = [(0, 0), (0, 0)]
+            pad[axis] = (size // 2, size // 2)
+            padded = np.pad(local_max, pad, mode="constant", constant_values=-np.inf)
+            local_max = np.lib.stride_tricks.sliding_window_view(padded, size, axis=axis).max(axis=-1)
+        threshold = spectrogram.mean() + spectrogram.std()
+        peak_frames, peak_bins = np.nonzero((spectrogram == local_max) & (spectrogram > threshold))
+
+        # Pair each anchor with the next FAN_OUT peaks (already sorted by frame)
+        hashes = []
+        for offset in range(1, self.FAN_OUT + 1):
+            anchor_frames, target_frames = peak_frames[:-offset], peak_frames[offset:]
+            dt = target_frames - anchor_frames
+            valid = (dt > 0) & (dt <= self.MAX_PAIR_FRAMES)
+            hash_values = (
+                (peak_bins[:-offset][valid].astype(np.int64) << 15)
+                | (peak_bins[offset:][valid].astype(np.int64) << 6)
+                | dt[valid]
+            )
+            hashes.append(np.stack([hash_values, anchor_frames[valid]], axis=1))
+        return np.concatenate(hashes).astype(np.int64)
+
+    def fingerprint_file(self, audio_path, max_seconds=None, use_cache=True):
+        """
+        Fingerprint an audio file, reusing the cached fingerprint for complete files
+        Returns:
+            np.ndarray: Fingerprint, or None if the file could not be decoded
+        """
+        cache_path = self.fingerprint_path(audio_path)
+        if use_cache and not max_seconds and os.path.exists(cache_path):
+            return np.load(cache_path)
+
+        samples = self.decode(audio_path, max_seconds)
+        if samples is None:
+            return None
+        fingerprint = self.fingerprint_samples(samples)
+
+        if use_cache and not max_seconds:
+            np.save(cache_path, fingerprint)
+        return fingerprint
+
+    def aligned_matches(self, query, reference):
+        """Number of hashes shared by query and reference at the most common time offset"""
+        if not len(query) or not len(reference):
+            return 0
+
+        order = np.argsort(reference[:, 0], kind="stable")
+        ref_hashes, ref_frames = reference[order, 0], reference[order, 1]
+        starts = np.searchsorted(ref_hashes, query[:, 0], side="left")
+        ends = np.searchsorted(ref_hashes, query[:, 0], side="right")
+        counts = ends - starts
+        if not counts.sum():
+            return 0
+
+        # Expand every query hash against every reference occurrence of it
+        query_frames = np.repeat(query[:, 1], counts)
+        ref_index = np.repeat(ends - np.cumsum(counts), counts) + np.arange(counts.sum())
+        offsets = ref_frames[ref_index] - query_frames
+        return int(np.unique(offsets, return_counts=True)[1].max())
+
+    def is_match(self, query, reference):
+        """Whether two fingerprints come from the same or overlapping audio"""
+        aligned = self.aligned_matches(query, reference)
+        smaller = min(len(query), len(reference))
+        return aligned >= self.MIN_ALIGNED_HASHES and aligned >= self.MIN_MATCH_RATIO * smaller
@@ -0,0 +1,157 @@
+import shutil
+import subprocess
+
+class AudioFormatter:
+    # Formats we can hand back to clients, ordered smallest-first for negotiation
+    FORMATS = ["opus", "mp3", "pcm"]
+
+    # Media types a client may list in Accept for each format
+    ACCEPT_TYPES = {
+        "opus": {"audio/ogg", "audio/opus"},
+        "mp3": {"audio/mpeg", "audio/mp3"},
+        "pcm": {"audio/pcm", "audio/l16"},
+    }
+
+    # Output formats ElevenLabs can produce directly
+    PROVIDER_FORMATS = {
+        "mp3_22050_32", "mp3_44100_32", "mp3_44100_64", "mp3_44100_96",
+        "mp3_44100_128", "mp3_44100_192",
+        "pcm_16000", "pcm_22050", "pcm_24000", "pcm_44100",
+    }
+
+    DEFAULT_FORMAT = "mp3"
+    FALLBACK_FORMAT = "mp3_22050_32"  # smallest provider format, used when transcoding fails
+    MIN_BITRATE = 8  # kbps
+    MAX_BITRATE = 320
+    DEFAULT_OPUS_BITRATE = 32  # kbps, plenty for a single voice
+    MP3_BITRATES = [32, 64, 96, 128, 192]
+    PCM_SAMPLE_RATE = 24000
+
+    def __init__(self):
+        self.ffmpeg_path = shutil.which("ffmpeg")
+
+    def negotiate(self, accept_header):
+        """
+        Pick the smallest format the client accepts
+        Args:
+            accept_header (str): Value of the Accept request header
+        Returns:
+            str: One of FORMATS; DEFAULT_FORMAT when the client has no audio preference
+        """
+        if not accept_header:
+            return self.DEFAULT_FORMAT
+
+        accepted = {}
+        for part in accept_header.split(","):
+            pieces = [p.strip() for p in part.split(";")]
+            media_type = pieces[0].lower()
+            q = 1.0
+            for param in pieces[1:]:
+                if param.startswith("q="):
+                    try:
+                        q = float(param[2:])
+                    except ValueError:
+                        q = 0.0
+            accepted[media_type] = q
+
+        for fmt in self.FORMATS:
+            # Most specific match wins; */* alone is not an audio preference
+            exact = [accepted[t] for t in self.ACCEPT_TYPES[fmt] if t in accepted]
+            if exact:
+                q = max(exact)
+            else:
+                q = accepted.get("audio/*", 0.0)
+            if q > 0:
+                return fmt
+        return self.DEFAULT_FORMAT
+
+    def resolve(self, output_format, bitrate=None):
+        """
+        Work out how to produce the requested format
+        Args:
+            output_format (str): "opus", "mp3", "pcm" or a provider-native name like "mp3_22050_32"
+            bitrate (int, optional): Target bitrate in kbps
+        Returns:
+            dict: provider_format, transcode (codec or None), bitrate and media_type,
+                  or None if the format or bitrate is not supported
+        """
+        output_format = (output_format or self.DEFAULT_FORMAT).lower()
+        if bitrate is not None and not self.MIN_BITRATE <= bitrate <= self.MAX_BITRATE:
+            return None
+
+        if output_format in self.PROVIDER_FORMATS:
+            return {
+                "provider_format": output_format,
+                "transcode": None,
+                "bitrate": None,
+                "media_type": self._media_type(output_format),
+            }
+
+        if output_format == "opus":
+            if not self.ffmpeg_path:
+                print("ffmpeg not available, falling back to MP3")
+                return self.resolve("mp3", bitrate)
+            # Fetch raw PCM so the only lossy step is the Opus encode
+            return {
+                "provider_format": f"pcm_{self.PCM_SAMPLE_RATE}",
+                "transcode": "opus",
+                "bitrate": bitrate or self.DEFAULT_OPUS_BITRATE,
+                "media_type": "audio/ogg",
+            }
+
+        if output_format == "mp3":
+            if not bitrate:
+                provider_format = "mp3_44100_128"
+            else:
+                nearest = min(self.MP3_BITRATES, key=lambda b: abs(b - bitrate))
+                provider_format = f"mp3_44100_{nearest}" if nearest > 32 else "mp3_22050_32"
+            return self.resolve(provider_format)
+
+        if output_format == "pcm":
+            return self.resolve(f"pcm_{self.PCM_SAMPLE_RATE}")
+
+        return None
+
+    def transcode(self, audio_data, source_format, codec, bitrate):
+        """
+        Transcode provider audio locally with ffmpeg
+        Args:
+            audio_data (bytes): Audio returned by the provider
+            source_format (str): Provider format of audio_data, e.g. "pcm_24000"
+            codec (str): Target codec, currently only "opus"
+            bitrate (int): Target bitrate in kbps
+        Returns:
+            bytes: Transcoded audio, or None on failure
+        """
+        if not self.ffmpeg_path or codec != "opus":
+            return None
+
+        try:
+            if source_format.startswith("pcm_"):
+                sample_rate = source_format.split("_")[1]
+                input_args = ["-f", "s16le", "-ar", sample_rate, "-ac", "1"]
+            else:
+                input_args = []
+
+            command = [
+                self.ffmpeg_path, "-hide_banner", "-loglevel", "error",
+                *input_args, "-i", "pipe:0",
+                "-c:a", "libopus", "-b:a", f"{bitrate}k", "-application", "voip",
+                "-f", "ogg", "pipe:1",
+            ]
+            result = subprocess.run(command, input=audio_data, capture_output=True, timeout=30)
+            if result.returncode != 0:
+                print(f"Error transcoding audio: {result.stderr.decode(errors='ignore')}")
+                return None
+            return result.stdout
+
+        except Exception as e:
+            print(f"Error transcoding audio: {str(e)}")
+            return None
+
+    def _media_type(self, provider_format):
+        """Media type for a provider-native format"""
+        if provider_format.startswith("pcm_"):
+            sample_rate = provider_format.split("_")[1]
+            return f"audio/pcm;rate={sample_rate};channels=1"
+        return "audio/mpeg"
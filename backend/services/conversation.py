@@ -0,0 +1,265 @@
+import asyncio
+import json
+import re
+import time
+from fastapi import WebSocket, WebSocketDisconnect
+
+class ConversationSession:
+    """
+    One conversation with a clone over a WebSocket.
+
+    Client -> server (JSON text frames):
+        {"type": "message", "text": "..."}  start a turn, interrupting any reply in progress
+        {"type": "cancel"}                  stop the reply in progress
+        {"type": "ping"} / {"type": "pong"} heartbeats
+    Server -> client:
+        JSON frames: ready, text_delta, text_done, audio_start, audio_end,
+                     turn_done, cancelled, error, ping, pong
+        binary frames: audio for the sentence announced by the preceding audio_start,
+                       in the media_type given on that audio_start
+    """
+    HEARTBEAT_INTERVAL = 15  # seconds between server pings
+    HEARTBEAT_TIMEOUT = 45  # close if the client is silent for this long
+    OUTBOUND_QUEUE_SIZE = 32  # frames buffered before generation waits on the client
+    SENTENCE_QUEUE_SIZE = 4  # sentences queued ahead of speech synthesis
+
+    def __init__(self, websocket: WebSocket, model, build_prompt, voice_generator=None,
+                 voice_id=None, audio_format=None, audio_formatter=None):
+        self.websocket = websocket
+        self.model = model
+        self.build_prompt = build_prompt
+        self.voice_generator = voice_generator
+        self.voice_id = voice_id
+        self.audio_format = audio_format
+        self.audio_formatter = audio_formatter
+        self.history = []
+        self.outbound = asyncio.Queue(maxsize=self.OUTBOUND_QUEUE_SIZE)
+        self.turn_task = None
+        self.turn_id = 0
+        self.active_turn_id = None
+        self.last_seen = time.monotonic()
+        self.closing = False
+
+    async def run(self):
+        """Serve the connection until the client leaves or stops answering heartbeats"""
+        sender = asyncio.create_task(self._sender())
+        receiver = asyncio.create_task(self._receive_loop())
+        heartbeat = asyncio.create_task(self._heartbeat())
+
+        await self._send(None, {
+            "type": "ready",
+            "audio": bool(self.voice_id),
+            "media_type": self.audio_format["media_type"] if self.voice_id else None,
+        })
+
+        try:
+            # The sender ending means a send failed, i.e. the client is gone
+            done, _ = await asyncio.wait({receiver, heartbeat, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if heartbeat in done:
+                print("Closing conversation after missed heartbeats")
+                await self.websocket.close(code=1001)
+        except Exception as e:
+            print(f"Error in conversation: {str(e)}")
+        finally:
+            # Nothing drains the queue any more, so teardown must never wait on it
+            self.closing = True
+            await self._cancel_turn()
+            for task in (receiver, heartbeat, sender):
+                task.cancel()
+            await asyncio.gather(receiver, heartbeat, sender, return_exceptions=True)
+
+    async def _receive_loop(self):
+        while True:
+            try:
+                frame = await self.websocket.receive()
+            except WebSocketDisconnect:
+                return
+            if frame["type"] == "websocket.disconnect":
+                return
+            self.last_seen = time.monotonic()
+
+            raw = frame.get("text")
+            if raw is None:
+                await self._send(None, {"type": "error", "message": "Only JSON text frames are accepted"})
+                continue
+
+            try:
+                message = json.loads(raw)
+                message_type = message.get("type")
+            except (ValueError, AttributeError):
+                await self._send(None, {"type": "error", "message": "Invalid JSON message"})
+                continue
+
+            if message_type == "message":
+                text = (message.get("text") or "").strip()
+                if not text:
+                    await self._send(None, {"type": "error", "message": "Empty message"})
+                    continue
+                # A new message while replying is treated as an interruption
+                await self._cancel_turn()
+                self.turn_id += 1
+                self.active_turn_id = self.turn_id
+                self.turn_task = asyncio.create_task(self._run_turn(self.turn_id, text))
+            elif message_type == "cancel":
+                await self._cancel_turn()
+            elif message_type == "ping":
+                await self._send(None, {"type": "pong"})
+            elif message_type == "pong":
+                continue
+            else:
+                await self._send(None, {"type": "error", "message": f"Unknown message type: {message_type}"})
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_seen > self.HEARTBEAT_TIMEOUT:
+                return
+            await self._send(None, {"type": "ping"})
+
+    async def _send(self, turn_id, payload):
+        """Queue a frame; blocks when the client is not keeping up"""
+        if self.closing:
+            # Best effort only while tearing down
+            try:
+                self.outbound.put_nowait((turn_id, payload))
+            except asyncio.QueueFull:
+                pass
+            return
+        await self.outbound.put((turn_id, payload))
+
+    async def _sender(self):
+        while True:
+            turn_id, payload = await self.outbound.get()
+            # Drop frames that belong to a turn which has since been cancelled
+            if turn_id is not None and turn_id != self.active_turn_id:
+                continue
+            if isinstance(payload, bytes):
+                await self.websocket.send_bytes(payload)
+            else:
+                await self.websocket.send_json(payload)
+
+    async def _cancel_turn(self):
+        if self.turn_task and not self.turn_task.done():
+            cancelled_id = self.active_turn_id
+            self.active_turn_id = None
+            self.turn_task.cancel()
+            try:
+                await self.turn_task
+            except asyncio.CancelledError:
+                pass
+            await self._send(None, {"type": "cancelled", "turn": cancelled_id})
+        self.turn_task = None
+
+    def _split_sentences(self, buffer):
+        """Split complete sentences off the front of buffer"""
+        parts = re.split(r"(?<=[.!?])\s+", buffer)
+        return [p for p in parts[:-1] if p.strip()], parts[-1]
+
+    async def _run_turn(self, turn_id, text):
+        reply = ""
+        sentences = asyncio.Queue(maxsize=self.SENTENCE_QUEUE_SIZE)
+        speaker = None
+        if self.voice_id:
+            speaker = asyncio.create_task(self._speak(turn_id, sentences))
+
+        try:
+            prompt = await asyncio.to_thread(self.build_prompt, text)
+            contents = self.history + [{"role": "user", "parts": [prompt]}]
+            response = await self.model.generate_content_async(contents, stream=True)
+
+            buffer = ""
+            async for chunk in response:
+                try:
+                    delta = chunk.text
+                except ValueError:
+                    continue
+                reply += delta
+                await self._send(turn_id, {"type": "text_delta", "turn": turn_id, "text": delta})
+                if speaker:
+                    buffer += delta
+                    complete, buffer = self._split_sentences(buffer)
+                    for sentence in complete:
+                        await sentences.put(sentence)
+
+            await self._send(turn_id, {"type": "text_done", "turn": turn_id, "text": reply})
+
+            if speaker:
+                if buffer.strip():
+                    await sentences.put(buffer.strip())
+                await sentences.put(None)
+                await speaker
+
+            await self._send(turn_id, {"type": "turn_done", "turn": turn_id})
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error generating conversation reply: {str(e)}")
+            await self._send(turn_id, {"type": "error", "turn": turn_id, "message": str(e)})
+        finally:
+            if speaker and not speaker.done():
+                speaker.cancel()
+            # Keep what the user actually heard, including interrupted replies
+            if reply:
+                self.history.append({"role": "user", "parts": [text]})
+                self.history.append({"role": "model", "parts": [reply]})
+
+    async def _speak(self, turn_id, sentences):
+        index = 0
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                return
+
+            provider_format = self.audio_format["provider_format"]
+
+            if self.audio_format["transcode"]:
+                # Transcoded formats need the whole sentence before encoding
+                audio_data = await asyncio.to_thread(
+                    self.voice_generator.text_to_speech, self.voice_id, sentence, provider_format
+                )
+                media_type = self.audio_format["media_type"]
+                if audio_data:
+                    audio_data = await asyncio.to_thread(
+                        self.audio_formatter.transcode,
+                        audio_data,
+                        provider_format,
+                        self.audio_format["transcode"],
+                        self.audio_format["bitrate"]
+                    )
+                if not audio_data:
+                    # Never hand raw PCM to a client that asked for a compact format
+                    fallback = self.audio_formatter.resolve(self.audio_formatter.FALLBACK_FORMAT)
+                    audio_data = await asyncio.to_thread(
+                        self.voice_generator.text_to_speech, self.voice_id, sentence, fallback["provider_format"]
+                    )
+                    media_type = fallback["media_type"]
+                await self._send(turn_id, {"type": "audio_start", "turn": turn_id, "index": index, "media_type": media_type})
+                if audio_data:
+                    await self._send(turn_id, audio_data)
+            else:
+                await self._send(turn_id, {
+                    "type": "audio_start",
+                    "turn": turn_id,
+                    "index": index,
+                    "media_type": self.audio_format["media_type"]
+                })
+                stream = self.voice_generator.text_to_speech_stream(self.voice_id, sentence, provider_format)
+                pending = None
+                try:
+                    while True:
+                        # Shielded so a cancel doesn't lose track of the read still running in the worker thread
+                        pending = asyncio.ensure_future(asyncio.to_thread(next, stream, None))
+                        audio_chunk = await asyncio.shield(pending)
+                        if audio_chunk is None:
+                            break
+                        await self._send(turn_id, audio_chunk)
+                finally:
+                    if pending is not None and not pending.done():
+                        # A generator can't be closed while it runs; close it once that chunk returns
+                        pending.add_done_callback(lambda _: stream.close())
+                    else:
+                        stream.close()
+
+            await self._send(turn_id, {"type": "audio_end", "turn": turn_id, "index": index})
+            index += 1
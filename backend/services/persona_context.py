@@ -0,0 +1,109 @@
+import hashlib
+import datetime
+from collections import OrderedDict
+import google.generativeai as genai
+
+class PersonaContext:
+    """A chat model compiled for one persona, with the persona as system instruction"""
+    def __init__(self, name, version, model, token_count, cached_content=None, expires_at=None):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.token_count = token_count  # tokens the persona adds to every turn
+        self.cached_content = cached_content
+        self.expires_at = expires_at  # when the provider-side cache lapses
+
+    def expired(self):
+        return self.expires_at is not None and datetime.datetime.now(datetime.timezone.utc) >= self.expires_at
+
+class PersonaContextCache:
+    """
+    LRU of compiled persona contexts keyed by persona name and prompt version.
+
+    Provider-side context caching only applies to personas of at least
+    CACHE_MIN_TOKENS. The core persona prompts create_clone writes are kept
+    under 200 words, so today the saving comes from the local LRU and the
+    provider cache only kicks in for much larger personas.
+    """
+    MODEL_NAME = "gemini-2.0-flash"
+    CACHE_MODEL_NAME = "models/gemini-2.0-flash-001"  # context caching needs a pinned version
+    CACHE_MIN_TOKENS = 4096  # smaller contexts are not accepted for provider caching
+    CACHE_TTL = datetime.timedelta(hours=1)
+
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self.contexts = OrderedDict()
+
+    def system_instruction(self, name, persona_prompt):
+        return f"""You are a simulation of {name}. Here is your personality:
+{persona_prompt}
+
+Remember to stay in character and respond as {name} would."""
+
+    def version(self, persona_prompt):
+        """Short content hash so an updated prompt gets a freshly compiled context"""
+        return hashlib.sha256(persona_prompt.encode("utf-8")).hexdigest()[:12]
+
+    def get(self, name, persona_prompt):
+        """
+        Get the compiled context for a persona, building it on first use
+        Args:
+            name (str): Persona name
+            persona_prompt (str): Stored personality prompt
+        Returns:
+            PersonaContext: Compiled context
+        """
+        key = (name, self.version(persona_prompt))
+        if key in self.contexts and not self.contexts[key].expired():
+            self.contexts.move_to_end(key)
+            return self.contexts[key]
+
+        # Drop stale or expired versions of this persona before compiling the new one.
+        # Provider caches are left to lapse via their TTL since open conversations may still use them
+        for stale_key in [k for k in self.contexts if k[0] == name]:
+            del self.contexts[stale_key]
+
+        context = self._compile(name, key[1], persona_prompt)
+        self.contexts[key] = context
+        while len(self.contexts) > self.max_size:
+            self.contexts.popitem(last=False)
+        return context
+
+    def _count_tokens(self, system_instruction):
+        try:
+            # Counted on a bare model so the instruction isn't counted twice
+            return genai.GenerativeModel(self.MODEL_NAME).count_tokens(system_instruction).total_tokens
+        except Exception as e:
+            print(f"Error counting persona tokens: {str(e)}")
+            return None
+
+    def _create_cached_content(self, name, version, system_instruction):
+        try:
+            return genai.caching.CachedContent.create(
+                model=self.CACHE_MODEL_NAME,
+                display_name=f"persona-{version}",
+                system_instruction=system_instruction,
+                ttl=self.CACHE_TTL
+            )
+        except Exception as e:
+            print(f"Context caching unavailable for {name}: {str(e)}")
+            return None
+
+    def _compile(self, name, version, persona_prompt):
+        system_instruction = self.system_instruction(name, persona_prompt)
+        model = genai.GenerativeModel(self.MODEL_NAME, system_instruction=system_instruction)
+        token_count = self._count_tokens(system_instruction)
+
+        # Large personas are cached provider-side so they aren't re-processed every turn
+        cached_content = None
+        expires_at = None
+        if token_count and token_count >= self.CACHE_MIN_TOKENS:
+            cached_content = self._create_cached_content(name, version, system_instruction)
+            if cached_content is not None:
+                model = genai.GenerativeModel.from_cached_content(cached_content)
+                # Recompile a little before the provider drops the cache
+                expires_at = datetime.datetime.now(datetime.timezone.utc) + self.CACHE_TTL - datetime.timedelta(minutes=5)
+
+        print(f"Compiled chat context for {name} ({token_count} persona tokens, "
+              f"{'cached' if cached_content else 'not cached'})")
+        return PersonaContext(name, version, model, token_count, cached_content, expires_at)
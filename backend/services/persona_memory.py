@@ -0,0 +1,140 @@
+import os
+import re
+import json
+import numpy as np
+import google.generativeai as genai
+
+class PersonaMemory:
+    EMBEDDING_MODEL = "models/text-embedding-004"
+    MAX_CHUNK_CHARS = 800
+    EMBED_BATCH_SIZE = 100
+
+    def __init__(self, persona_name, index_dir="persona_index"):
+        self.persona_name = persona_name
+        slug = re.sub(r"[^a-z0-9]+", "_", persona_name.lower()).strip("_")
+        self.index_path = os.path.join(index_dir, slug)
+        self.embeddings_file = os.path.join(self.index_path, "embeddings.npy")
+        self.chunks_file = os.path.join(self.index_path, "chunks.json")
+        os.makedirs(self.index_path, exist_ok=True)
+        self.embeddings = None
+        self.chunks = []
+        self._load()
+
+    def _load(self):
+        """Load the on-disk index, memory-mapping the embedding matrix"""
+        try:
+            if os.path.exists(self.embeddings_file) and os.path.exists(self.chunks_file):
+                self.embeddings = np.load(self.embeddings_file, mmap_mode="r")
+                with open(self.chunks_file, "r") as f:
+                    self.chunks = json.load(f)
+        except Exception as e:
+            print(f"Error loading persona index: {str(e)}")
+            self.embeddings = None
+            self.chunks = []
+
+    def _chunk_text(self, text):
+        """Split text into paragraph-aligned chunks of at most MAX_CHUNK_CHARS"""
+        chunks = []
+        current = ""
+        for paragraph in re.split(r"\n\s*\n", text):
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+            # Paragraphs that are too long on their own are split on sentences
+            pieces = [paragraph]
+            if len(paragraph) > self.MAX_CHUNK_CHARS:
+                pieces = re.split(r"(?<=[.!?])\s+", paragraph)
+            for piece in pieces:
+                if current and len(current) + len(piece) + 1 > self.MAX_CHUNK_CHARS:
+                    chunks.append(current)
+                    current = ""
+                current = f"{current} {piece}".strip()
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _embed(self, texts, task_type):
+        """
+        Embed texts with Gemini
+        Returns:
+            np.ndarray: L2-normalised float32 matrix, one row per text
+        """
+        vectors = []
+        for i in range(0, len(texts), self.EMBED_BATCH_SIZE):
+            result = genai.embed_content(
+                model=self.EMBEDDING_MODEL,
+                content=texts[i:i + self.EMBED_BATCH_SIZE],
+                task_type=task_type
+            )
+            vectors.extend(result["embedding"])
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def add_texts(self, texts, source, chunk=True, replace=False):
+        """
+        Chunk, embed and append texts to the persona index
+        Args:
+            texts (list): Documents to add, e.g. a research report or tweets
+            source (str): Label stored with each chunk ("research", "tweets", ...)
+            chunk (bool): Split long documents; short items like tweets can skip this
+            replace (bool): Replace the existing index instead of appending to it.
+                The old index is only swapped out once the new one is written
+        Returns:
+            int: Number of chunks added
+        """
+        try:
+            if chunk:
+                new_chunks = [c for text in texts for c in self._chunk_text(text)]
+            else:
+                new_chunks = [" ".join(t.split()) for t in texts if t and t.strip()]
+            if not new_chunks:
+                return 0
+
+            new_embeddings = self._embed(new_chunks, "retrieval_document")
+            chunks = [] if replace else list(self.chunks)
+            if not replace and self.embeddings is not None and len(self.embeddings):
+                new_embeddings = np.concatenate([np.asarray(self.embeddings), new_embeddings])
+            chunks.extend({"text": c, "source": source} for c in new_chunks)
+
+            # Write to temp files and swap so readers never see a partial index
+            tmp_embeddings = self.embeddings_file + ".tmp.npy"
+            tmp_chunks = self.chunks_file + ".tmp"
+            np.save(tmp_embeddings, new_embeddings)
+            with open(tmp_chunks, "w") as f:
+                json.dump(chunks, f)
+            os.replace(tmp_embeddings, self.embeddings_file)
+            os.replace(tmp_chunks, self.chunks_file)
+
+            self.chunks = chunks
+            self.embeddings = np.load(self.embeddings_file, mmap_mode="r")
+            print(f"Indexed {len(new_chunks)} {source} chunks for {self.persona_name}")
+            return len(new_chunks)
+
+        except Exception as e:
+            print(f"Error indexing {source} for {self.persona_name}: {str(e)}")
+            return 0
+
+    def search(self, query, k=4):
+        """
+        Retrieve the chunks most relevant to a query
+        Args:
+            query (str): Text to search for, typically the user's message
+            k (int): Maximum number of chunks to return
+        Returns:
+            list: Chunk texts ordered by similarity
+        """
+        if self.embeddings is None or not len(self.chunks):
+            return []
+
+        try:
+            query_vector = self._embed([query], "retrieval_query")[0]
+            scores = self.embeddings @ query_vector
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [self.chunks[i]["text"] for i in top]
+
+        except Exception as e:
+            print(f"Error searching persona index: {str(e)}")
+            return []
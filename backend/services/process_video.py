@@ -5,6 +5,8 @@ import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import re
 from urllib.parse import parse_qs, urlparse
+from services.audio_fingerprint import AudioFingerprinter
+from services.speaker_check import SpeakerVerifier
 
 class VideoProcessor:
     def __init__(self):
@@ -14,6 +16,11 @@ class VideoProcessor:
         os.makedirs(self.output_dir, exist_ok=True)
         self.MAX_VIDEO_DURATION = 300  # 5 minutes in seconds
         self.RAPID_API_KEY = "c14a64b518mshe0eaa5705ea7846p14f95fjsn657a5b82a797"
+        self.PROBE_BYTES = 512 * 1024  # roughly the first 30s of a 128kbps MP3
+        self.PROBE_SECONDS = 30
+        self.fingerprinter = AudioFingerprinter()
+        self.known_fingerprints = []  # (audio_path, fingerprint) of samples kept this run
+        self.speaker_verifier = SpeakerVerifier(self.output_dir)
         
     def _get_video_id(self, url):
         """Extract video ID from YouTube URL"""
@@ -105,8 +112,18 @@ class VideoProcessor:
             print(f"Error selecting audio format: {str(e)}")
             return None
 
+    def _find_duplicate(self, fingerprint):
+        """Return the path of a kept sample that fingerprint matches, if any"""
+        if fingerprint is None:
+            return None
+        for known_path, known_fingerprint in self.known_fingerprints:
+            if self.fingerprinter.is_match(fingerprint, known_fingerprint):
+                return known_path
+        return None
+
     def _download_video(self, url):
         """Download audio from YouTube video using RapidAPI with time segments"""
+        partial_path = None
         try:
             start_time = time.time()
             print(f"\nProcessing URL for audio extraction: {url}")
@@ -117,6 +134,19 @@ class VideoProcessor:
                 print("Invalid YouTube URL")
                 return None
                 
+            # Reuse a sample already in the download cache
+            output_path = os.path.join(self.download_dir, f"{video_id}.mp3")
+            if os.path.exists(output_path):
+                print(f"Using cached audio {output_path}")
+                fingerprint = self.fingerprinter.fingerprint_file(output_path)
+                duplicate_of = self._find_duplicate(fingerprint)
+                if duplicate_of:
+                    print(f"Skipping {url}: same audio as {duplicate_of}")
+                    return None
+                if fingerprint is not None:
+                    self.known_fingerprints.append((output_path, fingerprint))
+                return output_path
+
             duration = self._get_video_duration(video_id)
             if not duration:
                 print("Could not get video duration")
@@ -155,16 +185,46 @@ class VideoProcessor:
                 
             # Download the MP3 file
             download_url = result['link']
-            output_path = os.path.join(self.download_dir, f"{video_id}.mp3")
             
-            # Download the file
-            mp3_response = requests.get(download_url)
-            if mp3_response.status_code != 200:
-                print(f"Error downloading MP3: {mp3_response.status_code}")
+            # Stream the file, checking the first seconds against samples we already have.
+            # It only lands at output_path once complete so the cache never holds partial files
+            partial_path = os.path.join(self.download_dir, f"{video_id}.part.mp3")
+            duplicate_of = None
+            with requests.get(download_url, stream=True) as mp3_response:
+                if mp3_response.status_code != 200:
+                    print(f"Error downloading MP3: {mp3_response.status_code}")
+                    return None
+
+                with open(partial_path, 'wb') as f:
+                    downloaded = 0
+                    probed = not self.known_fingerprints
+                    for chunk in mp3_response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        if not probed and downloaded >= self.PROBE_BYTES:
+                            probed = True
+                            f.flush()
+                            probe = self.fingerprinter.fingerprint_file(
+                                partial_path, max_seconds=self.PROBE_SECONDS, use_cache=False
+                            )
+                            duplicate_of = self._find_duplicate(probe)
+                            if duplicate_of:
+                                break
+
+            if duplicate_of:
+                os.remove(partial_path)
+                print(f"Stopped downloading {url} after {downloaded / 1024:.0f}KB: same audio as {duplicate_of}")
                 return None
-                
-            with open(output_path, 'wb') as f:
-                f.write(mp3_response.content)
+            os.replace(partial_path, output_path)
+
+            # Short files and overlaps that start later in the clip are caught here
+            fingerprint = self.fingerprinter.fingerprint_file(output_path)
+            duplicate_of = self._find_duplicate(fingerprint)
+            if duplicate_of:
+                print(f"Skipping {url}: overlaps with {duplicate_of}")
+                return None
+            if fingerprint is not None:
+                self.known_fingerprints.append((output_path, fingerprint))
                 
             elapsed = time.time() - start_time
             file_size = os.path.getsize(output_path) / (1024 * 1024)  # Size in MB
@@ -174,11 +234,15 @@ class VideoProcessor:
             
         except Exception as e:
             print(f"Error processing {url}: {str(e)}")
+            # Never leave a partial download behind
+            if partial_path and os.path.exists(partial_path):
+                os.remove(partial_path)
             return None
 
     def process_videos(self, video_urls, profile_info):
-        """Process videos sequentially to extract audio"""
+        """Process videos sequentially to extract audio, skipping duplicate samples"""
         audio_paths = []
+        self.known_fingerprints = []
         
         for url in video_urls:
             try:
@@ -190,5 +254,8 @@ class VideoProcessor:
             except Exception as e:
                 print(f"Error processing {url}: {str(e)}")
                 continue
+
+        # Keep only the person's own voice so wrong-speaker samples never reach a clone upload
+        audio_paths = self.speaker_verifier.filter_samples(audio_paths)
                     
         return audio_paths[0] if audio_paths else None
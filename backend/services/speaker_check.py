@@ -0,0 +1,250 @@
+import os
+import shutil
+import subprocess
+import numpy as np
+from services.audio_decode import decode_audio
+
+class SpeakerVerifier:
+    """
+    CPU-only check that candidate samples share the target speaker's voice.
+
+    Each sample is cut into short segments described by their median pitch,
+    which unlike spectral features is not coloured by the recording channel.
+    A sample is split into two voices when its segments fall into clearly
+    separate pitch groups, the voice that recurs across samples is taken as
+    the target speaker, and only its segments are kept.
+
+    Pitch alone only tells apart voices that differ markedly, such as a host
+    of the other gender or a much higher or lower voice. Speakers within a
+    few semitones of each other are not separated and pass as before.
+    """
+    SAMPLE_RATE = 16000
+    HOP_SIZE = 160  # 10ms
+    PITCH_FRAME_SIZE = 640  # 40ms, at least two periods of the lowest pitch
+    MIN_PITCH = 60  # Hz
+    MAX_PITCH = 400
+    VOICING_THRESHOLD = 0.5  # normalised autocorrelation needed to count a frame as voiced
+    OCTAVE_RATIO = 0.9  # prefer the shortest lag within this fraction of the strongest one
+    SEGMENT_FRAMES = 300  # 3s segments
+    SILENCE_RATIO = 0.1  # segments quieter than this fraction of the median are dropped
+    MIN_VOICED_FRACTION = 0.2  # segments with less voiced speech than this are dropped
+    # Calibrated on the committed real recordings: splitting one speaker's segments in two
+    # leaves groups up to ~2.7 semitones apart, while voices 1.25x higher or lower sit ~3-5 apart
+    SPLIT_SEMITONES = 3.0
+    # The same person across two recordings differed by under 1 semitone; 1.25x voices by 3.5+
+    SAME_SPEAKER_SEMITONES = 2.5
+    MIN_CLUSTER_FRACTION = 0.1
+    MIN_SPEECH_SECONDS = 30
+    KMEANS_ITERATIONS = 10
+
+    def __init__(self, output_dir="processed_audio"):
+        self.ffmpeg_path = shutil.which("ffmpeg")
+        self.output_dir = output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.window = np.hanning(self.PITCH_FRAME_SIZE)
+        # Autocorrelation of the window itself, used to undo its taper at longer lags
+        window_autocorrelation = np.correlate(self.window, self.window, "full")[self.PITCH_FRAME_SIZE - 1:]
+        self.window_autocorrelation = np.maximum(window_autocorrelation / window_autocorrelation[0], 1e-3)
+        self.min_lag = self.SAMPLE_RATE // self.MAX_PITCH
+        self.max_lag = self.SAMPLE_RATE // self.MIN_PITCH
+
+    def decode(self, audio_path):
+        """Decode audio to mono float samples at SAMPLE_RATE, or None on failure"""
+        return decode_audio(self.ffmpeg_path, audio_path, self.SAMPLE_RATE)
+
+    def _frame_pitches(self, frames):
+        """
+        Pitch of each frame from its normalised autocorrelation
+        Returns:
+            tuple: (pitch in Hz, NaN for unvoiced frames; energy of each frame)
+        """
+        frames = frames - frames.mean(axis=1, keepdims=True)
+        spectrum = np.fft.rfft(frames * self.window, n=2 * self.PITCH_FRAME_SIZE, axis=1)
+        autocorrelation = np.fft.irfft(np.abs(spectrum) ** 2, axis=1)[:, :self.PITCH_FRAME_SIZE]
+        energy = autocorrelation[:, 0]
+        normalised = autocorrelation / np.maximum(energy[:, None], 1e-10) / self.window_autocorrelation
+
+        candidates = normalised[:, self.min_lag:self.max_lag + 1]
+        best = candidates.max(axis=1)
+        # A multiple of the period correlates about as well as the period itself, so take the shortest good lag
+        lags = self.min_lag + np.argmax(candidates >= self.OCTAVE_RATIO * best[:, None], axis=1)
+        pitch = np.where(best >= self.VOICING_THRESHOLD, self.SAMPLE_RATE / lags, np.nan)
+        return pitch, energy
+
+    def segment_pitches(self, samples):
+        """
+        Median pitch of each voiced SEGMENT_FRAMES-long segment of a sample
+        Returns:
+            tuple: (pitches in semitones of shape (N,), segment indices of shape (N,))
+        """
+        empty = (np.empty(0, dtype=np.float32), np.empty(0, dtype=int))
+        if len(samples) < self.PITCH_FRAME_SIZE:
+            return empty
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.PITCH_FRAME_SIZE)[::self.HOP_SIZE]
+        segment_count = len(frames) // self.SEGMENT_FRAMES
+        if not segment_count:
+            return empty
+
+        pitches = np.full(segment_count, np.nan)
+        energies = np.zeros(segment_count)
+        voiced_fractions = np.zeros(segment_count)
+        # One segment at a time keeps the autocorrelation buffers small for long samples
+        for segment in range(segment_count):
+            pitch, energy = self._frame_pitches(frames[segment * self.SEGMENT_FRAMES:(segment + 1) * self.SEGMENT_FRAMES])
+            voiced = ~np.isnan(pitch)
+            energies[segment] = energy.mean()
+            voiced_fractions[segment] = voiced.mean()
+            if voiced.any():
+                pitches[segment] = np.median(pitch[voiced])
+
+        # Drop silence and segments with too little voiced speech to place a pitch
+        kept = np.nonzero(
+            (energies >= self.SILENCE_RATIO * np.median(energies)) & (voiced_fractions >= self.MIN_VOICED_FRACTION)
+        )[0]
+        return (12 * np.log2(pitches[kept])).astype(np.float32), kept
+
+    def _split_speakers(self, pitches, members=None):
+        """
+        Split one sample's segments into voices by repeated two-means clustering of their pitch,
+        so a host, the target and e.g. a music outro each end up in their own group
+        Returns:
+            list: Member mask per voice; a single mask when no split is convincing
+        """
+        if members is None:
+            members = np.ones(len(pitches), dtype=bool)
+        values = pitches[members]
+        if len(values) < 4:
+            return [members]
+
+        centroids = np.array([values.min(), values.max()], dtype=np.float64)
+        for _ in range(self.KMEANS_ITERATIONS):
+            labels = np.argmin(np.abs(values[:, None] - centroids[None, :]), axis=1)
+            for cluster in range(2):
+                if np.any(labels == cluster):
+                    centroids[cluster] = values[labels == cluster].mean()
+
+        halves = []
+        for cluster in range(2):
+            half = np.zeros(len(pitches), dtype=bool)
+            half[np.nonzero(members)[0][labels == cluster]] = True
+            halves.append(half)
+        if min(half.sum() for half in halves) < self.MIN_CLUSTER_FRACTION * len(pitches):
+            return [members]
+        if abs(np.median(pitches[halves[0]]) - np.median(pitches[halves[1]])) < self.SPLIT_SEMITONES:
+            return [members]
+        return self._split_speakers(pitches, halves[0]) + self._split_speakers(pitches, halves[1])
+
+    def select_speaker(self, sample_pitches):
+        """
+        Pick the speaker consistent across samples
+        Args:
+            sample_pitches (list): Segment pitches per sample, as returned by segment_pitches
+        Returns:
+            list: Boolean mask of segments to keep per sample, or None for rejected samples
+        """
+        if not any(len(p) for p in sample_pitches):
+            return [None] * len(sample_pitches)
+
+        clusters = []  # (sample index, member mask)
+        for index, pitches in enumerate(sample_pitches):
+            if len(pitches):
+                clusters.extend((index, mask) for mask in self._split_speakers(pitches))
+
+        def voice(cluster):
+            index, mask = cluster
+            return float(np.median(sample_pitches[index][mask]))
+
+        # Score each cluster by how many other samples contain the same voice, then by duration
+        best_score, reference = None, None
+        for cluster in clusters:
+            recurring_samples = {
+                other[0] for other in clusters
+                if other[0] != cluster[0] and abs(voice(cluster) - voice(other)) < self.SAME_SPEAKER_SEMITONES
+            }
+            score = (len(recurring_samples), int(cluster[1].sum()))
+            if best_score is None or score > best_score:
+                best_score, reference = score, cluster
+
+        frames_per_second = self.SAMPLE_RATE // self.HOP_SIZE
+        min_segments = self.MIN_SPEECH_SECONDS * frames_per_second // self.SEGMENT_FRAMES
+        selections = []
+        for index in range(len(sample_pitches)):
+            candidates = [
+                (abs(voice(cluster) - voice(reference)), cluster[1])
+                for cluster in clusters if cluster[0] == index
+            ]
+            if not candidates:
+                selections.append(None)
+                continue
+            distance, mask = min(candidates, key=lambda candidate: candidate[0])
+            if distance >= self.SAME_SPEAKER_SEMITONES or mask.sum() < min_segments:
+                selections.append(None)
+            else:
+                selections.append(mask)
+        return selections
+
+    def _write_segments(self, audio_path, segment_indices):
+        """Cut the kept segments out of the original file, keeping its quality"""
+        segment_seconds = self.SEGMENT_FRAMES * self.HOP_SIZE / self.SAMPLE_RATE
+
+        # Merge runs of consecutive segments into time ranges
+        ranges = []
+        for index in segment_indices:
+            start = index * segment_seconds
+            if ranges and abs(ranges[-1][1] - start) < 1e-6:
+                ranges[-1][1] = start + segment_seconds
+            else:
+                ranges.append([start, start + segment_seconds])
+        selection = "+".join(f"between(t,{start:.2f},{end:.2f})" for start, end in ranges)
+
+        base_name = os.path.splitext(os.path.basename(audio_path))[0]
+        output_path = os.path.join(self.output_dir, f"{base_name}_speaker.mp3")
+        command = [
+            self.ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y", "-i", audio_path,
+            "-af", f"aselect='{selection}',asetpts=N/SR/TB",
+            "-c:a", "libmp3lame", "-q:a", "2", output_path
+        ]
+        result = subprocess.run(command, capture_output=True, timeout=120)
+        if result.returncode != 0:
+            print(f"Error writing speaker segments: {result.stderr.decode(errors='ignore')}")
+            return None
+        return output_path
+
+    def filter_samples(self, audio_paths):
+        """
+        Keep only the consistent speaker's segments, dropping samples without them
+        Args:
+            audio_paths (list): Candidate sample files
+        Returns:
+            list: Paths of filtered samples, in input order
+        """
+        if not self.ffmpeg_path:
+            print("ffmpeg not available, skipping speaker check")
+            return audio_paths
+
+        try:
+            decoded = [(path, self.decode(path)) for path in audio_paths]
+            decoded = [(path, samples) for path, samples in decoded if samples is not None]
+            if not decoded:
+                return audio_paths
+            analysed = [(path, self.segment_pitches(samples)) for path, samples in decoded]
+            selections = self.select_speaker([pitches for _, (pitches, _) in analysed])
+
+            filtered = []
+            for (path, (_, segment_indices)), members in zip(analysed, selections):
+                if members is None:
+                    print(f"Dropping {path}: target speaker not found")
+                    continue
+                if members.all():
+                    # Single-speaker sample, no need to re-encode it
+                    filtered.append(path)
+                    continue
+                print(f"Keeping {int(members.sum())} of {len(members)} segments from {path}")
+                output_path = self._write_segments(path, segment_indices[members])
+                if output_path:
+                    filtered.append(output_path)
+            return filtered
+
+        except Exception as e:
+            print(f"Error checking speakers: {str(e)}")
+            return audio_paths
@@ -1,4 +1,6 @@
 import os
+import json
+import hashlib
 import requests
 from dotenv import load_dotenv
 
@@ -10,7 +12,7 @@ class VoiceGenerator:
         self.output_dir = "generated_voices"
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def generate_voice_clone(self, audio_path, voice_name, description=None, remove_background_noise=True):
+    def generate_voice_clone(self, audio_path, voice_name, description=None, remove_background_noise=True, sample_hash=None):
         """
         Generate a voice clone using ElevenLabs API
         Args:
@@ -18,6 +20,7 @@ class VoiceGenerator:
             voice_name (str): Name for the generated voice
             description (str, optional): Description of the voice
             remove_background_noise (bool): Whether to remove background noise
+            sample_hash (str, optional): Content hash of the sample, computed if not given
         Returns:
             dict: Response from ElevenLabs API containing voice_id and verification status
         """
@@ -29,6 +32,9 @@ class VoiceGenerator:
                 print(f"Error: Audio file not found at {audio_path}")
                 return None
                 
+            if not sample_hash:
+                sample_hash = self.hash_sample(audio_path)
+
             # Prepare API endpoint
             url = f"{self.base_url}/voices/add"
             
@@ -49,6 +55,10 @@ class VoiceGenerator:
             
             if description:
                 data['description'] = description
+
+            # Label the voice with its sample hash so it can be matched later
+            if sample_hash:
+                data['labels'] = json.dumps({"sample_sha256": sample_hash})
             
             # Make API request
             print("Sending request to ElevenLabs API...")
@@ -60,7 +70,7 @@ class VoiceGenerator:
                 print(f"Successfully created voice clone! Voice ID: {result['voice_id']}")
                 
                 # Save voice ID for future reference
-                self._save_voice_id(voice_name, result['voice_id'])
+                self._save_voice_id(voice_name, result['voice_id'], sample_hash)
                 
                 return result
             else:
@@ -75,14 +85,17 @@ class VoiceGenerator:
             if 'files' in locals() and hasattr(files['files'][1], 'close'):
                 files['files'][1].close()
 
-    def _save_voice_id(self, voice_name, voice_id):
+    def _save_voice_id(self, voice_name, voice_id, sample_hash=None):
         """
-        Save voice ID to a file for future reference
+        Save voice ID (and the hash of the sample it was cloned from) to a file for future reference
         """
         try:
             voice_file = os.path.join(self.output_dir, "voice_ids.txt")
             with open(voice_file, "a") as f:
-                f.write(f"{voice_name}: {voice_id}\n")
+                if sample_hash:
+                    f.write(f"{voice_name}: {voice_id} {sample_hash}\n")
+                else:
+                    f.write(f"{voice_name}: {voice_id}\n")
         except Exception as e:
             print(f"Error saving voice ID: {str(e)}")
 
@@ -90,28 +103,118 @@ class VoiceGenerator:
         """
         Retrieve a previously saved voice ID
         """
+        saved = self._get_saved_voice(voice_name)
+        return saved["voice_id"] if saved else None
+
+    def _get_saved_voice(self, voice_name):
+        """
+        Retrieve the most recently saved voice for a name
+        Returns:
+            dict: voice_id and sample_hash (may be None), or None if not saved
+        """
         try:
             voice_file = os.path.join(self.output_dir, "voice_ids.txt")
             if not os.path.exists(voice_file):
                 return None
-                
+
+            saved = None
             with open(voice_file, "r") as f:
                 for line in f:
                     if line.startswith(f"{voice_name}: "):
-                        return line.split(": ")[1].strip()
-            return None
+                        fields = line.split(": ", 1)[1].split()
+                        if fields:
+                            saved = {
+                                "voice_id": fields[0],
+                                "sample_hash": fields[1] if len(fields) > 1 else None
+                            }
+            return saved
         except Exception as e:
             print(f"Error reading voice ID: {str(e)}")
             return None
 
-    def text_to_speech(self, voice_id, text):
+    def _list_cloned_voices(self):
+        """
+        List the voices cloned in the ElevenLabs account, leaving out premade and library voices
+        Returns:
+            list: Voice dicts from the API, or None if the listing failed
+        """
+        try:
+            response = requests.get(f"{self.base_url}/voices", headers={"xi-api-key": self.api_key})
+            if response.status_code != 200:
+                print(f"Error listing voices: {response.text}")
+                return None
+            return [v for v in response.json().get("voices", []) if v.get("category") == "cloned"]
+        except Exception as e:
+            print(f"Error listing voices: {str(e)}")
+            return None
+
+    def find_existing_voice(self, voice_name):
+        """
+        Find a voice already cloned for this name. A local registry entry is used only
+        if the provider still lists it, since entries may point to voices deleted upstream;
+        otherwise a cloned voice with this name is looked up in the provider's listing.
+        Returns:
+            dict: voice_id and sample_hash (may be None), or None if there is none
+        """
+        saved = self._get_saved_voice(voice_name)
+        cloned_voices = self._list_cloned_voices()
+        if cloned_voices is None:
+            # Can't verify right now; the registry is the best we have
+            return saved
+
+        if saved:
+            if any(v["voice_id"] == saved["voice_id"] for v in cloned_voices):
+                return saved
+            print(f"Saved voice {saved['voice_id']} for {voice_name} no longer exists upstream")
+
+        for voice in cloned_voices:
+            if voice.get("name") == voice_name:
+                labels = voice.get("labels") or {}
+                found = {
+                    "voice_id": voice["voice_id"],
+                    "sample_hash": labels.get("sample_sha256")
+                }
+                # Remember it locally; the newest registry entry wins on lookup
+                self._save_voice_id(voice_name, found["voice_id"], found["sample_hash"])
+                return found
+        return None
+
+    def delete_voice(self, voice_id):
+        """
+        Delete a voice from the ElevenLabs account to free its slot
+        Returns:
+            bool: Whether the voice was deleted
+        """
+        try:
+            response = requests.delete(f"{self.base_url}/voices/{voice_id}", headers={"xi-api-key": self.api_key})
+            if response.status_code == 200:
+                print(f"Deleted voice {voice_id}")
+                return True
+            print(f"Error deleting voice: {response.text}")
+            return False
+        except Exception as e:
+            print(f"Error deleting voice: {str(e)}")
+            return False
+
+    def hash_sample(self, audio_path):
+        """
+        SHA-256 of an audio sample, used to tell whether the source audio changed
+        """
+        sha256 = hashlib.sha256()
+        with open(audio_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def text_to_speech(self, voice_id, text, output_format="mp3_44100_128"):
         """
         Generate speech from text using a specific voice
         Args:
             voice_id (str): ID of the voice to use
             text (str): Text to convert to speech
+            output_format (str): ElevenLabs output format, e.g. "mp3_22050_32" or "pcm_24000"
         Returns:
-            bytes: Audio data in MP3 format
+            bytes: Audio data in the requested format
         """
         try:
             print(f"\nGenerating speech using voice ID: {voice_id}")
@@ -137,7 +240,12 @@ class VoiceGenerator:
             
             # Make API request
             print("Sending request to ElevenLabs API...")
-            response = requests.post(url, headers=headers, json=data)
+            response = requests.post(
+                url,
+                headers=headers,
+                json=data,
+                params={"output_format": output_format}
+            )
             
             # Check response
             if response.status_code == 200:
@@ -150,3 +258,51 @@ class VoiceGenerator:
         except Exception as e:
             print(f"Error in text-to-speech: {str(e)}")
             return None
+
+    def text_to_speech_stream(self, voice_id, text, output_format="mp3_44100_128", chunk_size=4096):
+        """
+        Stream speech from text as it is generated
+        Args:
+            voice_id (str): ID of the voice to use
+            text (str): Text to convert to speech
+            output_format (str): ElevenLabs output format
+            chunk_size (int): Bytes per yielded chunk
+        Yields:
+            bytes: Audio data in the requested format
+        """
+        response = None
+        try:
+            url = f"{self.base_url}/text-to-speech/{voice_id}/stream"
+            headers = {
+                "xi-api-key": self.api_key,
+                "Content-Type": "application/json"
+            }
+            data = {
+                "text": text,
+                "model_id": "eleven_monolingual_v1",
+                "voice_settings": {
+                    "stability": 0.5,
+                    "similarity_boost": 0.75
+                }
+            }
+
+            response = requests.post(
+                url,
+                headers=headers,
+                json=data,
+                params={"output_format": output_format},
+                stream=True
+            )
+            if response.status_code != 200:
+                print(f"Error streaming speech: {response.text}")
+                return
+
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+
+        except Exception as e:
+            print(f"Error in streaming text-to-speech: {str(e)}")
+        finally:
+            if response is not None:
+                response.close()
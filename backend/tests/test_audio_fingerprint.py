@@ -0,0 +1,36 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from services.audio_fingerprint import AudioFingerprinter
+
+def synthetic_speech(seconds, seed):
+    """Tones that change pitch every 100ms, a rough stand-in for voiced speech"""
+    rng = np.random.default_rng(seed)
+    rate = AudioFingerprinter.SAMPLE_RATE
+    segment = rate // 10
+    t = np.arange(segment) / rate
+    pieces = [
+        sum(np.sin(2 * np.pi * f * t) for f in rng.uniform(100, 3500, size=3))
+        for _ in range(seconds * 10)
+    ]
+    return np.concatenate(pieces).astype(np.float32) / 3
+
+def test_reupload_with_offset_matches():
+    fingerprinter = AudioFingerprinter()
+    original = synthetic_speech(30, seed=1)
+    rate = AudioFingerprinter.SAMPLE_RATE
+    # A clip starting 7.3s in, with some added noise
+    clip = original[int(7.3 * rate):int(20 * rate)]
+    clip = clip + np.random.default_rng(3).normal(0, 0.05, len(clip)).astype(np.float32)
+
+    reference = fingerprinter.fingerprint_samples(original)
+    assert fingerprinter.is_match(fingerprinter.fingerprint_samples(clip), reference)
+
+def test_different_audio_does_not_match():
+    fingerprinter = AudioFingerprinter()
+    first = fingerprinter.fingerprint_samples(synthetic_speech(20, seed=1))
+    second = fingerprinter.fingerprint_samples(synthetic_speech(20, seed=2))
+    assert len(first) and len(second)
+    assert not fingerprinter.is_match(first, second)
@@ -0,0 +1,36 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.audio_format import AudioFormatter
+
+def test_negotiate_picks_smallest_accepted_format():
+    formatter = AudioFormatter()
+    assert formatter.negotiate(None) == "mp3"
+    assert formatter.negotiate("*/*") == "mp3"
+    assert formatter.negotiate("audio/mpeg, audio/ogg;q=0.5") == "opus"
+    assert formatter.negotiate("audio/ogg;q=0, audio/*") == "mp3"
+    assert formatter.negotiate("audio/pcm") == "pcm"
+
+def test_resolve_formats():
+    formatter = AudioFormatter()
+    assert formatter.resolve("mp3")["provider_format"] == "mp3_44100_128"
+    assert formatter.resolve("mp3", bitrate=40)["provider_format"] == "mp3_22050_32"
+    assert formatter.resolve("pcm_16000")["media_type"] == "audio/pcm;rate=16000;channels=1"
+    assert formatter.resolve("flac") is None
+
+    formatter.ffmpeg_path = "ffmpeg"
+    opus = formatter.resolve("opus", bitrate=24)
+    assert opus["provider_format"] == "pcm_24000"
+    assert opus["transcode"] == "opus"
+    assert opus["media_type"] == "audio/ogg"
+
+    formatter.ffmpeg_path = None
+    assert formatter.resolve("opus")["provider_format"] == "mp3_44100_128"
+
+def test_resolve_rejects_out_of_range_bitrate():
+    formatter = AudioFormatter()
+    formatter.ffmpeg_path = "ffmpeg"
+    assert formatter.resolve("opus", bitrate=-32) is None
+    assert formatter.resolve("mp3", bitrate=10000) is None
+    assert formatter.resolve(AudioFormatter.FALLBACK_FORMAT)["media_type"] == "audio/mpeg"
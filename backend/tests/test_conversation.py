@@ -0,0 +1,243 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import time
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from services.conversation import ConversationSession
+from services.audio_format import AudioFormatter
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    """Streams a canned reply word by word, optionally stalling before the end"""
+    def __init__(self, reply, stall=False):
+        self.reply = reply
+        self.stall = stall
+        self.calls = []
+
+    async def generate_content_async(self, contents, stream=False):
+        self.calls.append(contents)
+        return self._stream()
+
+    async def _stream(self):
+        for word in self.reply.split(" "):
+            yield FakeChunk(word + " ")
+        if self.stall:
+            await asyncio.sleep(60)
+
+def make_client(fake_model, **session_args):
+    app = FastAPI()
+
+    @app.websocket("/conversation")
+    async def conversation(websocket: WebSocket):
+        await websocket.accept()
+        session = ConversationSession(websocket, model=fake_model, build_prompt=lambda message: message, **session_args)
+        await session.run()
+
+    return TestClient(app)
+
+def test_conversation_streams_reply_and_keeps_history():
+    fake_model = FakeModel("Hello there friend.")
+    with make_client(fake_model).websocket_connect("/conversation") as websocket:
+        assert websocket.receive_json()["type"] == "ready"
+
+        websocket.send_json({"type": "message", "text": "Hi"})
+        deltas = []
+        while True:
+            message = websocket.receive_json()
+            if message["type"] == "text_delta":
+                deltas.append(message["text"])
+            elif message["type"] == "text_done":
+                assert message["text"] == "".join(deltas)
+            elif message["type"] == "turn_done":
+                break
+        assert "".join(deltas).strip() == "Hello there friend."
+
+        websocket.send_json({"type": "message", "text": "Again"})
+        while websocket.receive_json()["type"] != "turn_done":
+            pass
+
+    # The second turn carries the first exchange as history
+    assert [c["role"] for c in fake_model.calls[1]] == ["user", "model", "user"]
+
+def test_conversation_cancel_interrupts_reply():
+    fake_model = FakeModel("Partial reply", stall=True)
+    with make_client(fake_model).websocket_connect("/conversation") as websocket:
+        assert websocket.receive_json()["type"] == "ready"
+
+        websocket.send_json({"type": "message", "text": "Hi"})
+        assert websocket.receive_json()["type"] == "text_delta"
+        websocket.send_json({"type": "cancel"})
+        while True:
+            message = websocket.receive_json()
+            assert message["type"] not in {"text_done", "turn_done"}
+            if message["type"] == "cancelled":
+                break
+
+        websocket.send_json({"type": "ping"})
+        assert websocket.receive_json()["type"] == "pong"
+
+class DroppingWebSocket:
+    """Client that sends one message, then vanishes: sends fail and receive reports a disconnect"""
+    def __init__(self):
+        self.sent = 0
+        self.gone = asyncio.Event()
+        self.messages = [{"type": "websocket.receive", "text": '{"type": "message", "text": "Hi"}'}]
+
+    async def receive(self):
+        if self.messages:
+            return self.messages.pop(0)
+        await self.gone.wait()
+        return {"type": "websocket.disconnect", "code": 1006}
+
+    async def send_json(self, payload):
+        self.sent += 1
+        if self.sent > 3:
+            self.gone.set()
+            raise RuntimeError("connection closed")
+
+    async def send_bytes(self, payload):
+        await self.send_json(payload)
+
+    async def close(self, code=1000):
+        pass
+
+class EndlessModel:
+    async def generate_content_async(self, contents, stream=False):
+        return self._stream()
+
+    async def _stream(self):
+        while True:
+            yield FakeChunk("word ")
+            await asyncio.sleep(0)
+
+def test_client_dropping_mid_reply_ends_session():
+    websocket = DroppingWebSocket()
+    session = ConversationSession(websocket, model=EndlessModel(), build_prompt=lambda message: message)
+
+    async def run_with_timeout():
+        await asyncio.wait_for(session.run(), timeout=5)
+
+    asyncio.run(run_with_timeout())
+    assert session.turn_task is None
+
+def test_binary_frames_are_rejected_with_error():
+    with make_client(FakeModel("Hi.")).websocket_connect("/conversation") as websocket:
+        assert websocket.receive_json()["type"] == "ready"
+        websocket.send_bytes(b"\x00\x01")
+        assert websocket.receive_json()["type"] == "error"
+
+        # The session is still usable afterwards
+        websocket.send_json({"type": "ping"})
+        assert websocket.receive_json()["type"] == "pong"
+
+class FakeVoiceGenerator:
+    """Speaks each sentence as two chunks, or streams forever when endless"""
+    def __init__(self, endless=False):
+        self.endless = endless
+        self.requests = []
+        self.closed = 0
+
+    def text_to_speech(self, voice_id, text, output_format="mp3_44100_128"):
+        self.requests.append((text, output_format))
+        return f"{output_format}:{text}".encode()
+
+    def text_to_speech_stream(self, voice_id, text, output_format="mp3_44100_128"):
+        self.requests.append((text, output_format))
+        try:
+            yield f"{text}|".encode()
+            while self.endless:
+                time.sleep(0.005)
+                yield b"more|"
+            yield b"end"
+        finally:
+            self.closed += 1
+
+class FailingTranscoder(AudioFormatter):
+    def transcode(self, audio_data, source_format, codec, bitrate):
+        return None
+
+MP3_FORMAT = {"provider_format": "mp3_44100_128", "transcode": None, "bitrate": None, "media_type": "audio/mpeg"}
+OPUS_FORMAT = {"provider_format": "pcm_24000", "transcode": "opus", "bitrate": 32, "media_type": "audio/ogg"}
+
+def receive_audio(websocket):
+    """Audio frames of one turn, up to turn_done"""
+    frames = []
+    while True:
+        frame = websocket.receive()
+        if frame.get("bytes") is not None:
+            frames.append(("bytes", frame["bytes"]))
+            continue
+        message = json.loads(frame["text"])
+        if message["type"] == "turn_done":
+            return frames
+        if message["type"] in {"audio_start", "audio_end"}:
+            frames.append((message["type"], message["index"], message.get("media_type")))
+
+def test_reply_is_spoken_sentence_by_sentence():
+    voice_generator = FakeVoiceGenerator()
+    client = make_client(
+        FakeModel("First one. Second one!"),
+        voice_generator=voice_generator, voice_id="voice", audio_format=MP3_FORMAT
+    )
+    with client.websocket_connect("/conversation") as websocket:
+        assert websocket.receive_json()["audio"] is True
+        websocket.send_json({"type": "message", "text": "Hi"})
+        frames = receive_audio(websocket)
+
+    assert frames == [
+        ("audio_start", 0, "audio/mpeg"), ("bytes", b"First one.|"), ("bytes", b"end"), ("audio_end", 0, None),
+        ("audio_start", 1, "audio/mpeg"), ("bytes", b"Second one!|"), ("bytes", b"end"), ("audio_end", 1, None),
+    ]
+    assert voice_generator.requests == [("First one.", "mp3_44100_128"), ("Second one!", "mp3_44100_128")]
+    assert voice_generator.closed == 2
+
+def test_failed_transcode_falls_back_to_small_mp3():
+    voice_generator = FakeVoiceGenerator()
+    client = make_client(
+        FakeModel("Only sentence."),
+        voice_generator=voice_generator, voice_id="voice",
+        audio_format=OPUS_FORMAT, audio_formatter=FailingTranscoder()
+    )
+    with client.websocket_connect("/conversation") as websocket:
+        assert websocket.receive_json()["media_type"] == "audio/ogg"
+        websocket.send_json({"type": "message", "text": "Hi"})
+        frames = receive_audio(websocket)
+
+    fallback = AudioFormatter.FALLBACK_FORMAT
+    assert frames == [
+        ("audio_start", 0, "audio/mpeg"), ("bytes", f"{fallback}:Only sentence.".encode()), ("audio_end", 0, None),
+    ]
+    assert voice_generator.requests == [("Only sentence.", "pcm_24000"), ("Only sentence.", fallback)]
+
+def test_cancel_mid_audio_closes_the_stream():
+    voice_generator = FakeVoiceGenerator(endless=True)
+    client = make_client(
+        FakeModel("Keep talking."),
+        voice_generator=voice_generator, voice_id="voice", audio_format=MP3_FORMAT
+    )
+    with client.websocket_connect("/conversation") as websocket:
+        assert websocket.receive_json()["type"] == "ready"
+        websocket.send_json({"type": "message", "text": "Hi"})
+        while websocket.receive().get("bytes") is None:
+            pass
+
+        websocket.send_json({"type": "cancel"})
+        while True:
+            frame = websocket.receive()
+            if frame.get("text") is not None:
+                message = json.loads(frame["text"])
+                assert message["type"] not in {"audio_end", "turn_done"}
+                if message["type"] == "cancelled":
+                    break
+
+        deadline = time.monotonic() + 5
+        while not voice_generator.closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert voice_generator.closed == 1
@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datetime
+from services.persona_context import PersonaContextCache
+
+class OfflineContextCache(PersonaContextCache):
+    """Counts tokens by words and never calls the API"""
+    def __init__(self, max_size=32):
+        super().__init__(max_size)
+        self.compiled = []
+        self.cache_requests = 0
+
+    def _count_tokens(self, system_instruction):
+        return len(system_instruction.split())
+
+    def _create_cached_content(self, name, version, system_instruction):
+        self.cache_requests += 1
+        return None
+
+    def _compile(self, name, version, persona_prompt):
+        self.compiled.append(name)
+        return super()._compile(name, version, persona_prompt)
+
+def test_contexts_are_reused_and_recompiled_on_new_prompt():
+    cache = OfflineContextCache()
+    first = cache.get("Naval Ravikant", "You are Naval Ravikant, calm and aphoristic.")
+    assert cache.get("Naval Ravikant", "You are Naval Ravikant, calm and aphoristic.") is first
+    assert first.token_count == len(cache.system_instruction(
+        "Naval Ravikant", "You are Naval Ravikant, calm and aphoristic.").split())
+
+    updated = cache.get("Naval Ravikant", "You are Naval Ravikant, now more playful.")
+    assert updated is not first
+    assert updated.version != first.version
+    assert len(cache.contexts) == 1
+    # Short personas are below the provider caching minimum
+    assert cache.cache_requests == 0
+
+def test_least_recently_used_context_is_evicted():
+    cache = OfflineContextCache(max_size=2)
+    cache.get("A", "prompt a")
+    cache.get("B", "prompt b")
+    cache.get("A", "prompt a")
+    cache.get("C", "prompt c")
+    assert [name for name, _ in cache.contexts] == ["A", "C"]
+    assert cache.compiled == ["A", "B", "C"]
+
+def test_expired_provider_cache_is_recompiled():
+    cache = OfflineContextCache()
+    context = cache.get("A", "prompt a")
+    context.expires_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1)
+    assert cache.get("A", "prompt a") is not context
+    assert cache.compiled == ["A", "A"]
+
+class FakeCachedContent:
+    pass
+
+class LargePersonaCache(PersonaContextCache):
+    """Reports a persona above the provider caching minimum"""
+    def _count_tokens(self, system_instruction):
+        return self.CACHE_MIN_TOKENS + 1
+
+def test_large_persona_uses_provider_cache(monkeypatch):
+    from services import persona_context as persona_context_module
+    created = []
+
+    def create(**kwargs):
+        created.append(kwargs)
+        return FakeCachedContent()
+
+    monkeypatch.setattr(persona_context_module.genai.caching.CachedContent, "create", create)
+    monkeypatch.setattr(
+        persona_context_module.genai.GenerativeModel,
+        "from_cached_content",
+        lambda cached_content: ("model from cache", cached_content)
+    )
+
+    cache = LargePersonaCache()
+    context = cache.get("A", "a very long persona")
+    assert isinstance(context.cached_content, FakeCachedContent)
+    assert context.model == ("model from cache", context.cached_content)
+    assert created[0]["model"] == PersonaContextCache.CACHE_MODEL_NAME
+    assert created[0]["ttl"] == PersonaContextCache.CACHE_TTL
+    assert not context.expired()
+    assert cache.get("A", "a very long persona") is context
+
+    # Once the provider cache is about to lapse, the context is rebuilt with a fresh one
+    context.expires_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1)
+    refreshed = cache.get("A", "a very long persona")
+    assert refreshed is not context
+    assert len(created) == 2
@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from services.persona_memory import PersonaMemory
+
+VOCABULARY = ["rocket", "music", "startup", "family"]
+
+class KeywordMemory(PersonaMemory):
+    """PersonaMemory with a bag-of-words embedding instead of Gemini"""
+    def _embed(self, texts, task_type):
+        matrix = np.array(
+            [[text.lower().count(word) for word in VOCABULARY] for text in texts],
+            dtype=np.float32
+        )
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+def test_chunking_respects_max_size(tmp_path):
+    memory = KeywordMemory("Test Person", index_dir=str(tmp_path))
+    text = "\n\n".join(["A sentence about things. " * 20] * 5)
+    chunks = memory._chunk_text(text)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= memory.MAX_CHUNK_CHARS for chunk in chunks)
+
+def test_index_persists_and_searches(tmp_path):
+    memory = KeywordMemory("Test Person", index_dir=str(tmp_path))
+    memory.add_texts(["Built a rocket company.\n\nLoves music and jazz."], source="research")
+    memory.add_texts(["Every startup needs focus", "Dinner with family"], source="tweets", chunk=False)
+
+    reloaded = KeywordMemory("Test Person", index_dir=str(tmp_path))
+    assert isinstance(reloaded.embeddings, np.memmap)
+    assert len(reloaded.chunks) == 3
+    assert reloaded.search("tell me about the startup", k=1) == ["Every startup needs focus"]
+    assert reloaded.search("family rocket", k=2) == [
+        "Dinner with family",
+        "Built a rocket company. Loves music and jazz."
+    ]
+
+def test_failed_replace_keeps_existing_index(tmp_path):
+    memory = KeywordMemory("Test Person", index_dir=str(tmp_path))
+    memory.add_texts(["Built a rocket company."], source="research")
+
+    class QuotaMemory(KeywordMemory):
+        def _embed(self, texts, task_type):
+            raise RuntimeError("quota exceeded")
+
+    failing = QuotaMemory("Test Person", index_dir=str(tmp_path))
+    assert failing.add_texts(["Loves music."], source="research", replace=True) == 0
+    assert failing.chunks == [{"text": "Built a rocket company.", "source": "research"}]
+
+    reloaded = KeywordMemory("Test Person", index_dir=str(tmp_path))
+    assert reloaded.search("rocket", k=1) == ["Built a rocket company."]
+
+    assert reloaded.add_texts(["Loves music."], source="research", replace=True) == 1
+    assert [c["text"] for c in KeywordMemory("Test Person", index_dir=str(tmp_path)).chunks] == ["Loves music."]
@@ -0,0 +1,97 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from services import process_video
+from services.audio_fingerprint import AudioFingerprinter
+from test_audio_fingerprint import synthetic_speech
+
+CHUNK_SIZE = 64 * 1024
+
+class RawFingerprinter(AudioFingerprinter):
+    """Reads raw float32 samples instead of decoding MP3s with ffmpeg"""
+    def decode(self, audio_path, max_seconds=None):
+        samples = np.fromfile(audio_path, dtype=np.float32)
+        if max_seconds:
+            samples = samples[:max_seconds * self.SAMPLE_RATE]
+        return samples
+
+class FakeDownload:
+    """Chunked MP3 download that records how much of it was read"""
+    def __init__(self, data, fail_after=None):
+        self.status_code = 200
+        self.data = data
+        self.fail_after = fail_after
+        self.served = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.data), chunk_size):
+            if self.fail_after is not None and self.served >= self.fail_after:
+                raise ConnectionError("connection reset")
+            chunk = self.data[start:start + chunk_size]
+            self.served += len(chunk)
+            yield chunk
+
+class FakeLink:
+    status_code = 200
+
+    def json(self):
+        return {"link": "https://example.com/audio.mp3"}
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    video_processor = process_video.VideoProcessor()
+    video_processor.fingerprinter = RawFingerprinter()
+    monkeypatch.setattr(video_processor, "_get_video_duration", lambda video_id: 300)
+    monkeypatch.setattr(process_video.requests, "post", lambda *args, **kwargs: FakeLink())
+    return video_processor
+
+def serve(monkeypatch, download):
+    monkeypatch.setattr(process_video.requests, "get", lambda *args, **kwargs: download)
+
+def test_duplicate_stream_stops_after_probe(processor, monkeypatch):
+    audio = synthetic_speech(60, seed=1).tobytes()
+
+    serve(monkeypatch, FakeDownload(audio))
+    first = processor._download_video("https://youtu.be/first")
+    assert first == os.path.join("downloaded_videos", "first.mp3")
+
+    reupload = FakeDownload(audio)
+    serve(monkeypatch, reupload)
+    assert processor._download_video("https://youtu.be/reupload") is None
+    assert reupload.served < processor.PROBE_BYTES + CHUNK_SIZE < len(audio)
+    assert not os.path.exists(os.path.join("downloaded_videos", "reupload.mp3"))
+    assert not os.path.exists(os.path.join("downloaded_videos", "reupload.part.mp3"))
+
+    # Different audio downloads in full
+    other = FakeDownload(synthetic_speech(60, seed=2).tobytes())
+    serve(monkeypatch, other)
+    assert processor._download_video("https://youtu.be/other") == os.path.join("downloaded_videos", "other.mp3")
+    assert other.served == len(other.data)
+
+def test_cached_duplicate_is_skipped(processor, monkeypatch):
+    audio = synthetic_speech(20, seed=1).tobytes()
+    for video_id in ("first", "copy"):
+        with open(os.path.join("downloaded_videos", f"{video_id}.mp3"), "wb") as f:
+            f.write(audio)
+
+    def no_download(*args, **kwargs):
+        raise AssertionError("cached samples must not be downloaded again")
+    monkeypatch.setattr(process_video.requests, "post", no_download)
+
+    assert processor._download_video("https://youtu.be/first") == os.path.join("downloaded_videos", "first.mp3")
+    assert processor._download_video("https://youtu.be/copy") is None
+
+def test_failed_download_removes_partial_file(processor, monkeypatch):
+    serve(monkeypatch, FakeDownload(synthetic_speech(20, seed=1).tobytes(), fail_after=2 * CHUNK_SIZE))
+    assert processor._download_video("https://youtu.be/broken") is None
+    assert os.listdir("downloaded_videos") == []
@@ -0,0 +1,111 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import numpy as np
+import pytest
+from services.speaker_check import SpeakerVerifier
+
+RATE = SpeakerVerifier.SAMPLE_RATE
+RECORDINGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "downloaded_videos")
+FIRST_RECORDING = os.path.join(RECORDINGS, "6bulRiMfsSI.mp3")  # the same person in two different videos
+SECOND_RECORDING = os.path.join(RECORDINGS, "5Kv-Nr7twkE.mp3")
+requires_recordings = pytest.mark.skipif(
+    not shutil.which("ffmpeg") or not os.path.exists(FIRST_RECORDING) or not os.path.exists(SECOND_RECORDING),
+    reason="needs ffmpeg and the committed sample recordings"
+)
+VOWEL_FORMANTS = np.array([[730, 1090, 2440], [270, 2290, 3010], [300, 870, 2240], [530, 1840, 2480], [640, 1190, 2390]])
+
+def synthetic_voice(seconds, pitch, tract_scale, seed):
+    """Harmonic vowels at a speaker-specific pitch and formant scale"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(RATE // 5) / RATE
+    pieces = []
+    for _ in range(seconds * 5):
+        formants = VOWEL_FORMANTS[rng.integers(len(VOWEL_FORMANTS))] * tract_scale
+        f0 = pitch * rng.uniform(0.9, 1.1)
+        harmonics = np.arange(1, int(4000 / f0)) * f0
+        amplitudes = sum(np.exp(-((harmonics - f) / 120) ** 2) for f in formants) + 0.01
+        phases = rng.uniform(0, 2 * np.pi, (len(harmonics), 1))
+        wave = (amplitudes[:, None] * np.sin(2 * np.pi * harmonics[:, None] * t + phases)).sum(axis=0)
+        pieces.append(0.5 * wave / np.abs(wave).max())
+    return np.concatenate(pieces).astype(np.float32)
+
+def test_keeps_consistent_speaker_and_drops_others(tmp_path):
+    verifier = SpeakerVerifier(output_dir=str(tmp_path))
+    target = synthetic_voice(90, pitch=120, tract_scale=1.0, seed=1)
+    host = synthetic_voice(60, pitch=210, tract_scale=1.2, seed=2)
+    samples = [
+        synthetic_voice(60, pitch=120, tract_scale=1.0, seed=3),
+        np.concatenate([host, target[:45 * RATE]]),  # interview where the host talks most
+        target[45 * RATE:],
+        synthetic_voice(60, pitch=160, tract_scale=0.85, seed=4),  # somebody else entirely
+    ]
+    analysed = [verifier.segment_pitches(sample) for sample in samples]
+    selections = verifier.select_speaker([pitches for pitches, _ in analysed])
+
+    assert selections[0] is not None and selections[0].all()
+    assert selections[2] is not None and selections[2].all()
+    assert selections[3] is None
+
+    # Only the target's half of the interview survives
+    kept = analysed[1][1][selections[1]]
+    host_segments = len(host) // (verifier.SEGMENT_FRAMES * verifier.HOP_SIZE)
+    assert len(kept) >= 10
+    assert (kept >= host_segments - 1).all()
+
+def test_same_speaker_through_different_channel_is_kept(tmp_path):
+    verifier = SpeakerVerifier(output_dir=str(tmp_path))
+    clean = synthetic_voice(60, pitch=120, tract_scale=1.0, seed=5)
+    other_recording = synthetic_voice(60, pitch=120, tract_scale=1.0, seed=6)
+
+    # Colour the second recording with a resonant "microphone" around 2kHz
+    spectrum = np.fft.rfft(other_recording)
+    frequencies = np.fft.rfftfreq(len(other_recording), 1 / RATE)
+    spectrum *= 1 + 3 * np.exp(-((frequencies - 2000) / 800) ** 2)
+    coloured = np.fft.irfft(spectrum, len(other_recording)).astype(np.float32)
+
+    selections = verifier.select_speaker([
+        verifier.segment_pitches(clean)[0],
+        verifier.segment_pitches(coloured)[0],
+    ])
+    assert all(selection is not None and selection.all() for selection in selections)
+
+def test_decode_without_ffmpeg_returns_none(tmp_path):
+    verifier = SpeakerVerifier(output_dir=str(tmp_path))
+    verifier.ffmpeg_path = None
+    assert verifier.decode(str(tmp_path / "missing.mp3")) is None
+
+def shifted(samples, factor):
+    """Play real speech factor times faster: pitch and formants rise together, like a different voice"""
+    return np.interp(np.arange(0, len(samples) - 1, factor), np.arange(len(samples)), samples).astype(np.float32)
+
+@requires_recordings
+def test_real_recordings_reject_a_different_voice(tmp_path):
+    verifier = SpeakerVerifier(output_dir=str(tmp_path))
+    first = verifier.decode(FIRST_RECORDING)
+    second = verifier.decode(SECOND_RECORDING)
+    selections = verifier.select_speaker([
+        verifier.segment_pitches(samples)[0] for samples in (first, second, shifted(second, 1.3))
+    ])
+
+    assert selections[0] is not None and selections[0].sum() >= 15
+    assert selections[1] is not None and selections[1].all()
+    assert selections[2] is None
+
+@requires_recordings
+def test_real_interview_keeps_only_the_guest(tmp_path):
+    verifier = SpeakerVerifier(output_dir=str(tmp_path))
+    first = verifier.decode(FIRST_RECORDING)
+    second = verifier.decode(SECOND_RECORDING)
+    segment = verifier.SEGMENT_FRAMES * verifier.HOP_SIZE
+    host_segments = 45  # the host talks for 70% of the interview
+    interview = np.concatenate([shifted(second, 1.3)[:host_segments * segment], first[:20 * segment]])
+
+    analysed = [verifier.segment_pitches(samples) for samples in (interview, second)]
+    selections = verifier.select_speaker([pitches for pitches, _ in analysed])
+
+    kept = analysed[0][1][selections[0]]
+    assert (kept >= host_segments).sum() >= 15
+    assert (kept < host_segments).sum() <= 2
@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import voice_generator as voice_generator_module
+from services.voice_generator import VoiceGenerator
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+def make_generator(tmp_path):
+    generator = VoiceGenerator()
+    generator.output_dir = str(tmp_path)
+    return generator
+
+def test_local_registry_returns_latest_voice_and_hash(tmp_path, monkeypatch):
+    generator = make_generator(tmp_path)
+    generator._save_voice_id("Naval Ravikant", "old-id")
+    generator._save_voice_id("Naval Ravikant", "new-id", "abc123")
+    voices = {"voices": [{"voice_id": "new-id", "name": "Naval Ravikant", "category": "cloned"}]}
+    monkeypatch.setattr(voice_generator_module.requests, "get", lambda *args, **kwargs: FakeResponse(voices))
+
+    assert generator.get_saved_voice_id("Naval Ravikant") == "new-id"
+    assert generator.find_existing_voice("Naval Ravikant") == {"voice_id": "new-id", "sample_hash": "abc123"}
+
+def test_stale_registry_entry_is_replaced_from_listing(tmp_path, monkeypatch):
+    generator = make_generator(tmp_path)
+    generator._save_voice_id("Naval Ravikant", "deleted-id")
+    voices = {"voices": [{"voice_id": "live-id", "name": "Naval Ravikant", "category": "cloned", "labels": {}}]}
+    monkeypatch.setattr(voice_generator_module.requests, "get", lambda *args, **kwargs: FakeResponse(voices))
+
+    assert generator.find_existing_voice("Naval Ravikant") == {"voice_id": "live-id", "sample_hash": None}
+    assert generator.get_saved_voice_id("Naval Ravikant") == "live-id"
+
+def test_registry_is_used_when_listing_fails(tmp_path, monkeypatch):
+    generator = make_generator(tmp_path)
+    generator._save_voice_id("Naval Ravikant", "saved-id")
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("offline")
+    monkeypatch.setattr(voice_generator_module.requests, "get", fail)
+
+    assert generator.find_existing_voice("Naval Ravikant") == {"voice_id": "saved-id", "sample_hash": None}
+
+def test_only_cloned_provider_voices_are_reused(tmp_path, monkeypatch):
+    generator = make_generator(tmp_path)
+    voices = {"voices": [
+        {"voice_id": "stock", "name": "Rachel", "category": "premade", "labels": {}},
+        {"voice_id": "other", "name": "Someone Else", "category": "cloned", "labels": {}},
+        {"voice_id": "remote-id", "name": "Donald Trump", "category": "cloned", "labels": {"sample_sha256": "def456"}},
+    ]}
+    monkeypatch.setattr(voice_generator_module.requests, "get", lambda *args, **kwargs: FakeResponse(voices))
+
+    assert generator.find_existing_voice("Donald Trump") == {"voice_id": "remote-id", "sample_hash": "def456"}
+    assert generator.find_existing_voice("Rachel") is None
+    assert generator.find_existing_voice("Nobody") is None
+    assert generator.get_saved_voice_id("Donald Trump") == "remote-id"
+
+def test_hash_sample_depends_on_content(tmp_path):
+    generator = make_generator(tmp_path)
+    first = tmp_path / "a.mp3"
+    second = tmp_path / "b.mp3"
+    first.write_bytes(b"audio")
+    second.write_bytes(b"audio")
+    assert generator.hash_sample(str(first)) == generator.hash_sample(str(second))
+    second.write_bytes(b"other audio")
+    assert generator.hash_sample(str(first)) != generator.hash_sample(str(second))